@@ -1,7 +1,22 @@
-from .session_manager import SessionManager, Message, ConversationSession, PIIEntity
-from .pii_analyzer import PIIAnalyzer
-from .profile_builder import ProfileBuilder, PIIProfile
-from .inference_engine import InferenceEngine
+"""
+Core components for Theo - Conversational PII Tracker.
+
+Exports are imported on first use, so the standard-library-only modules
+(session_manager, profile_builder) don't pull in Presidio, spaCy or OpenAI.
+"""
+
+from importlib import import_module
+
+_EXPORTS = {
+    'SessionManager': '.session_manager',
+    'Message': '.session_manager',
+    'ConversationSession': '.session_manager',
+    'PIIEntity': '.session_manager',
+    'PIIAnalyzer': '.pii_analyzer',
+    'ProfileBuilder': '.profile_builder',
+    'PIIProfile': '.profile_builder',
+    'InferenceEngine': '.inference_engine',
+}
 
 __all__ = [
     'SessionManager',
@@ -13,3 +28,9 @@ __all__ = [
     'PIIProfile',
     'InferenceEngine'
 ]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name], __name__), name)
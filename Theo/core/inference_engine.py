@@ -4,17 +4,16 @@ Uses OpenAI to generate inferences from combined PII data.
 """
 
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import Iterator, Optional
 from openai import OpenAI
 
 
-INFERENCE_PROMPT_TEMPLATE = """You are a privacy analyst helping users understand what can be inferred about them from the personal information they've shared in a conversation with an AI.
+# Static instructions come first and the per-session PII context last, so
+# providers with prompt-prefix caching can reuse the unchanged prefix
+INFERENCE_INSTRUCTIONS = """You are a privacy analyst helping users understand what can be inferred about them from the personal information they've shared in a conversation with an AI.
 
-Given the following pieces of personal information revealed during a conversation:
-
-{pii_context}
-
-Please analyze what additional information can be inferred or deduced about this person. Be specific about:
+You will be given the pieces of personal information revealed during a conversation. Please analyze what additional information can be inferred or deduced about this person. Be specific about:
 1. **Likely identifiers**: Specific schools, employers, organizations they might be associated with
 2. **Demographic profile**: What can be inferred about their life circumstances
 3. **Location narrowing**: How the combination of information helps pinpoint their location
@@ -28,6 +27,22 @@ Important guidelines:
 
 Format your response as a clear, organized analysis that a non-technical user can understand."""
 
+QUICK_INFERENCE_INSTRUCTIONS = """In 2-3 sentences, what is the most significant inference that can be made by combining the pieces of personal information below? Focus on the most identifying combination."""
+
+PII_CONTEXT_TEMPLATE = """Personal information revealed during the conversation:
+
+{pii_context}"""
+
+INFERENCE_PROMPT_TEMPLATE = INFERENCE_INSTRUCTIONS + "\n\n" + PII_CONTEXT_TEMPLATE
+QUICK_PROMPT_TEMPLATE = QUICK_INFERENCE_INSTRUCTIONS + "\n\n" + PII_CONTEXT_TEMPLATE
+
+# Number of distinct PII contexts whose quick inference is kept in memory
+QUICK_CACHE_SIZE = 256
+
+# Attempts the OpenAI client makes on rate limits (429) and transient
+# errors, with exponential backoff that honours Retry-After
+MAX_RETRIES = 5
+
 
 class InferenceEngine:
     """Generates inferences from PII using OpenAI API."""
@@ -43,7 +58,13 @@ class InferenceEngine:
         self.client = None
 
         if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, max_retries=MAX_RETRIES)
+
+        # The quick inference runs on every message with PII, and repeated
+        # contexts (e.g. messages that add no new PII) are served from memory
+        self._quick_cached = lru_cache(maxsize=QUICK_CACHE_SIZE)(
+            self._request_quick
+        )
 
     def is_available(self) -> bool:
         """Check if the inference engine is available (API key configured)."""
@@ -64,6 +85,27 @@ class InferenceEngine:
         Returns:
             Generated inference text
 
+        Raises:
+            ValueError: If API key is not configured
+            Exception: If API call fails
+        """
+        return "".join(self.stream_inference(pii_context, model))
+
+    def stream_inference(
+        self,
+        pii_context: str,
+        model: str = "gpt-4o-mini"
+    ) -> Iterator[str]:
+        """
+        Stream the full inference as it is generated.
+
+        Args:
+            pii_context: Formatted string of PII data from ProfileBuilder
+            model: OpenAI model to use
+
+        Yields:
+            Chunks of inference text, in order
+
         Raises:
             ValueError: If API key is not configured
             Exception: If API call fails
@@ -75,12 +117,13 @@ class InferenceEngine:
             )
 
         if not pii_context or pii_context == "No personal information detected yet.":
-            return "No personal information has been detected yet. Share some messages to see what can be inferred."
+            yield "No personal information has been detected yet. Share some messages to see what can be inferred."
+            return
 
         prompt = INFERENCE_PROMPT_TEMPLATE.format(pii_context=pii_context)
 
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=model,
                 messages=[
                     {
@@ -93,10 +136,13 @@ class InferenceEngine:
                     }
                 ],
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=1000,
+                stream=True
             )
 
-            return response.choices[0].message.content
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
 
         except Exception as e:
             raise Exception(f"Failed to generate inference: {str(e)}")
@@ -122,26 +168,24 @@ class InferenceEngine:
         if not pii_context or pii_context == "No personal information detected yet.":
             return "No personal information detected yet."
 
-        quick_prompt = f"""Based on this personal information:
-
-{pii_context}
-
-In 2-3 sentences, what is the most significant inference that can be made by combining these pieces of information? Focus on the most identifying combination."""
-
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": quick_prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
-
-            return response.choices[0].message.content
+            return self._quick_cached(pii_context, model)
 
         except Exception:
             return "Unable to generate inference at this time."
+
+    def _request_quick(self, pii_context: str, model: str) -> str:
+        """Request the brief inference (uncached)."""
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": QUICK_PROMPT_TEMPLATE.format(pii_context=pii_context)
+                }
+            ],
+            temperature=0.7,
+            max_tokens=200
+        )
+
+        return response.choices[0].message.content
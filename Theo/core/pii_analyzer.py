@@ -3,12 +3,32 @@ PII Analyzer for Theo - Conversational PII Tracker
 Wraps Presidio AnalyzerEngine with custom recognizers for conversational PII.
 """
 
-from typing import List, Dict, Optional
-from presidio_analyzer import AnalyzerEngine, PatternRecognizer, Pattern
-from presidio_analyzer.nlp_engine import NlpEngineProvider
+import re
+import sys
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from presidio_analyzer import (
+    AnalysisExplanation,
+    AnalyzerEngine,
+    BatchAnalyzerEngine,
+    EntityRecognizer,
+    LocalRecognizer,
+    PatternRecognizer,
+    Pattern,
+    RecognizerResult,
+)
+from presidio_analyzer.nlp_engine import NlpArtifacts, NlpEngineProvider
+from spacy.language import Language
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc
 
 from .session_manager import PIIEntity
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 
 # Color guide for different entity types
 COLOR_GUIDE = {
@@ -81,152 +101,354 @@ COLOR_GUIDE = {
 # Default color for unknown entity types
 DEFAULT_COLOR = "#95A5A6"
 
+# spaCy model and pipeline components Presidio doesn't need
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+UNUSED_SPACY_PIPES = ("parser",)
+
+# Number of distinct (text, threshold) analyses kept in memory
+ANALYZE_CACHE_SIZE = 4096
+
+# (entity_type, score, start, end) for one detected entity
+Span = Tuple[str, float, int, int]
+
+
+# Regex patterns for conversational PII, keyed by the entity type they detect
+EDUCATION_PATTERNS = [
+    Pattern(
+        "education_student",
+        r"\b(college|university|high school|grad|graduate|undergraduate|"
+        r"freshman|sophomore|junior|senior|PhD|masters|bachelor|associate)"
+        r"(?:\s+(student|degree|program))?\b",
+        0.7
+    ),
+    Pattern(
+        "education_level",
+        r"\b(studying|enrolled|attending|graduated from|degree in|major in|"
+        r"majoring in)\b",
+        0.6
+    ),
+]
+
+AGE_PATTERNS = [
+    Pattern(
+        "explicit_age",
+        r"\b(I am|I\'m|I was|turned|turning)\s*\d{1,3}\s*(years old|year old|yo)?\b",
+        0.85
+    ),
+    Pattern(
+        "age_number",
+        r"\b\d{1,2}\s*(years old|year old|yo)\b",
+        0.8
+    ),
+    Pattern(
+        "age_group",
+        r"\b(teenager|teen|adolescent|young adult|middle-aged|elderly|"
+        r"senior citizen|in my\s*(twenties|thirties|forties|fifties|sixties|"
+        r"70s|80s|90s|20s|30s|40s|50s|60s))\b",
+        0.7
+    ),
+]
+
+CUSTOM_PATTERNS: Dict[str, List[Pattern]] = {
+    "EDUCATION_LEVEL": EDUCATION_PATTERNS,
+    "AGE": AGE_PATTERNS,
+}
 
-def create_education_recognizer() -> PatternRecognizer:
-    """Create recognizer for education-related PII."""
-    patterns = [
-        Pattern(
-            "education_student",
-            r"\b(college|university|high school|grad|graduate|undergraduate|"
-            r"freshman|sophomore|junior|senior|PhD|masters|bachelor|associate)\s*"
-            r"(student|degree|program)?\b",
-            0.7
-        ),
-        Pattern(
-            "education_level",
-            r"\b(studying|enrolled|attending|graduated from|degree in|major in|"
-            r"majoring in)\b",
-            0.6
-        ),
-    ]
-    return PatternRecognizer(
-        supported_entity="EDUCATION_LEVEL",
-        patterns=patterns,
-        name="Education Recognizer"
-    )
-
-
-def create_occupation_recognizer() -> PatternRecognizer:
-    """Create recognizer for occupation-related PII."""
-    patterns = [
-        Pattern(
-            "occupation_title",
-            r"\b(engineer|developer|doctor|nurse|teacher|professor|lawyer|"
-            r"accountant|manager|director|analyst|consultant|designer|"
-            r"architect|scientist|researcher|writer|journalist|artist|"
-            r"chef|pilot|mechanic|electrician|plumber|carpenter|"
-            r"salesperson|marketer|CEO|CTO|CFO|VP|president)\b",
-            0.6
-        ),
-        Pattern(
-            "work_context",
-            r"\b(work at|work for|employed by|job at|position at|"
-            r"my company|my employer|my boss|my job)\b",
-            0.5
-        ),
-    ]
-    return PatternRecognizer(
-        supported_entity="OCCUPATION",
-        patterns=patterns,
-        name="Occupation Recognizer"
-    )
-
-
-def create_relationship_recognizer() -> PatternRecognizer:
-    """Create recognizer for relationship-related PII."""
-    patterns = [
-        Pattern(
+# Vocabulary-based patterns, matched on spaCy tokens by PhraseMatcherRecognizer
+OCCUPATION_TITLES = [
+    "engineer", "developer", "doctor", "nurse", "teacher", "professor", "lawyer",
+    "accountant", "manager", "director", "analyst", "consultant", "designer",
+    "architect", "scientist", "researcher", "writer", "journalist", "artist",
+    "chef", "pilot", "mechanic", "electrician", "plumber", "carpenter",
+    "salesperson", "marketer", "CEO", "CTO", "CFO", "VP", "president",
+]
+
+WORK_CONTEXT_PHRASES = [
+    "work at", "work for", "employed by", "job at", "position at",
+    "my company", "my employer", "my boss", "my job",
+]
+
+FAMILY_MEMBERS = [
+    "husband", "wife", "spouse", "partner", "boyfriend", "girlfriend",
+    "mother", "father", "mom", "dad", "son", "daughter", "brother", "sister",
+    "grandmother", "grandfather", "grandma", "grandpa", "aunt", "uncle",
+    "cousin", "niece", "nephew", "in-law", "stepmother", "stepfather",
+]
+
+MARITAL_STATUSES = ["married", "single", "divorced", "widowed", "engaged", "dating"]
+
+HEALTH_CONDITIONS = [
+    "diabetes", "cancer", "asthma", "depression", "anxiety", "ADHD", "autism",
+    "arthritis", "hypertension", "heart disease", "epilepsy",
+    "multiple sclerosis", "Parkinson", "Alzheimer", "HIV", "AIDS",
+]
+
+HEALTH_DISCLOSURE_PREFIXES = ["diagnosed with", "suffering from", "have", "had"]
+
+MEDICAL_CONTEXT_PHRASES = [
+    "my doctor", "my therapist", "my psychiatrist", "my medication",
+    "taking pills", "prescription", "hospital visit", "surgery", "treatment",
+]
+
+
+class PhrasePattern(NamedTuple):
+    """A named list of literal phrases detected with a single score."""
+    name: str
+    phrases: List[str]
+    score: float
+
+
+CUSTOM_PHRASES: Dict[str, List[PhrasePattern]] = {
+    "OCCUPATION": [
+        PhrasePattern("occupation_title", OCCUPATION_TITLES, 0.6),
+        PhrasePattern("work_context", WORK_CONTEXT_PHRASES, 0.5),
+    ],
+    "RELATIONSHIP": [
+        PhrasePattern(
             "family_relationship",
-            r"\b(my\s+)?(husband|wife|spouse|partner|boyfriend|girlfriend|"
-            r"mother|father|mom|dad|son|daughter|brother|sister|"
-            r"grandmother|grandfather|grandma|grandpa|aunt|uncle|"
-            r"cousin|niece|nephew|in-law|stepmother|stepfather)\b",
+            FAMILY_MEMBERS + [f"my {member}" for member in FAMILY_MEMBERS],
             0.7
         ),
-        Pattern(
-            "marital_status",
-            r"\b(married|single|divorced|widowed|engaged|dating)\b",
-            0.6
-        ),
-    ]
-    return PatternRecognizer(
-        supported_entity="RELATIONSHIP",
-        patterns=patterns,
-        name="Relationship Recognizer"
-    )
-
-
-def create_age_recognizer() -> PatternRecognizer:
-    """Create recognizer for age-related PII."""
-    patterns = [
-        Pattern(
-            "explicit_age",
-            r"\b(I am|I\'m|I was|turned|turning)\s*\d{1,3}\s*(years old|year old|yo)?\b",
-            0.85
-        ),
-        Pattern(
-            "age_number",
-            r"\b\d{1,2}\s*(years old|year old|yo)\b",
-            0.8
-        ),
-        Pattern(
-            "age_group",
-            r"\b(teenager|teen|adolescent|young adult|middle-aged|elderly|"
-            r"senior citizen|in my\s*(twenties|thirties|forties|fifties|sixties|"
-            r"70s|80s|90s|20s|30s|40s|50s|60s))\b",
-            0.7
-        ),
-    ]
-    return PatternRecognizer(
-        supported_entity="AGE",
-        patterns=patterns,
-        name="Age Recognizer"
-    )
-
-
-def create_health_recognizer() -> PatternRecognizer:
-    """Create recognizer for health-related PII."""
-    patterns = [
-        Pattern(
+        PhrasePattern("marital_status", MARITAL_STATUSES, 0.6),
+    ],
+    "HEALTH_CONDITION": [
+        PhrasePattern(
             "health_condition",
-            r"\b(diagnosed with|suffering from|have|had)\s+"
-            r"(diabetes|cancer|asthma|depression|anxiety|ADHD|autism|"
-            r"arthritis|hypertension|heart disease|epilepsy|"
-            r"multiple sclerosis|Parkinson|Alzheimer|HIV|AIDS)\b",
+            [
+                f"{prefix} {condition}"
+                for prefix in HEALTH_DISCLOSURE_PREFIXES
+                for condition in HEALTH_CONDITIONS
+            ],
             0.8
         ),
-        Pattern(
-            "medical_context",
-            r"\b(my doctor|my therapist|my psychiatrist|my medication|"
-            r"taking pills|prescription|hospital visit|surgery|treatment)\b",
-            0.6
-        ),
-    ]
-    return PatternRecognizer(
-        supported_entity="HEALTH_CONDITION",
-        patterns=patterns,
-        name="Health Recognizer"
-    )
+        PhrasePattern("medical_context", MEDICAL_CONTEXT_PHRASES, 0.6),
+    ],
+}
+
+
+@lru_cache(maxsize=None)
+def _compile_regex(regex: str):
+    """
+    Compile a custom recognizer regex once per process.
+
+    Prefers RE2 (linear-time matching, no catastrophic backtracking) when the
+    google-re2 package is installed, falling back to Python's re module for
+    patterns RE2 can't handle or when it isn't available.
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(f"(?i){regex}")
+        except re2.error:
+            pass
+    return re.compile(regex, re.IGNORECASE)
+
+
+class MergedPatternRecognizer(LocalRecognizer):
+    """
+    Recognizer that scans text once per entity type for all custom regex patterns.
+
+    Each entity type's patterns become named groups in a single alternation;
+    the group that matched tells us which pattern and score to report.
+    Entity types get separate alternations so a match of one type can't
+    hide an overlapping match of another.
+    """
+
+    def __init__(
+        self,
+        patterns_by_entity: Dict[str, List[Pattern]],
+        name: str = "Conversational PII Recognizer"
+    ):
+        self._regexes = {}
+        self._dispatch: Dict[str, Pattern] = {}
+        for entity_type, patterns in patterns_by_entity.items():
+            groups = []
+            for i, pattern in enumerate(patterns):
+                group_name = f"{entity_type}__{i}"
+                self._dispatch[group_name] = pattern
+                groups.append(f"(?P<{group_name}>{pattern.regex})")
+
+            self._regexes[entity_type] = _compile_regex("|".join(groups))
+
+        super().__init__(
+            supported_entities=list(patterns_by_entity),
+            name=name
+        )
+
+    def load(self) -> None:
+        """Patterns are compiled in __init__, nothing to load."""
+
+    def analyze(
+        self,
+        text: str,
+        entities: List[str],
+        nlp_artifacts: Optional[NlpArtifacts] = None
+    ) -> List[RecognizerResult]:
+        """Walk each entity type's merged regex over the text and dispatch by group."""
+        results = []
+        for entity_type, regex in self._regexes.items():
+            if entities and entity_type not in entities:
+                continue
+
+            for match in regex.finditer(text):
+                start, end = match.span()
+                if start == end:
+                    continue
+
+                pattern = self._dispatch[match.lastgroup]
+                results.append(RecognizerResult(
+                    entity_type=entity_type,
+                    start=start,
+                    end=end,
+                    score=pattern.score,
+                    analysis_explanation=PatternRecognizer.build_regex_explanation(
+                        self.name,
+                        pattern.name,
+                        pattern.regex,
+                        pattern.score,
+                        None,
+                        re.IGNORECASE,
+                    ),
+                    recognition_metadata={
+                        RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
+                        RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
+                    },
+                ))
+
+        return EntityRecognizer.remove_duplicates(results)
+
+
+class PhraseMatcherRecognizer(LocalRecognizer):
+    """
+    Recognizer for vocabulary-style PII using spaCy's PhraseMatcher.
+
+    All phrases are matched case-insensitively in one pass over the tokens
+    spaCy already produced for the analyzer, instead of as regex alternations.
+    Whitespace-only tokens are skipped, so "had  cancer" still matches the
+    phrase "had cancer".
+    """
+
+    def __init__(
+        self,
+        phrases_by_entity: Dict[str, List[PhrasePattern]],
+        nlp: Language,
+        name: str = "Conversational Phrase Recognizer"
+    ):
+        self._matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        self._dispatch: Dict[int, Tuple[str, PhrasePattern]] = {}
+        for entity_type, phrase_patterns in phrases_by_entity.items():
+            for phrase_pattern in phrase_patterns:
+                key = f"{entity_type}__{phrase_pattern.name}"
+                self._matcher.add(
+                    key,
+                    [nlp.make_doc(phrase) for phrase in phrase_pattern.phrases]
+                )
+                self._dispatch[nlp.vocab.strings[key]] = (entity_type, phrase_pattern)
+
+        super().__init__(
+            supported_entities=list(phrases_by_entity),
+            name=name
+        )
+
+    def load(self) -> None:
+        """The matcher is built in __init__, nothing to load."""
+
+    def analyze(
+        self,
+        text: str,
+        entities: List[str],
+        nlp_artifacts: Optional[NlpArtifacts] = None
+    ) -> List[RecognizerResult]:
+        """Match all phrases against the analyzer's spaCy tokens."""
+        if not nlp_artifacts or nlp_artifacts.tokens is None:
+            return []
+
+        # spaCy gives extra whitespace tokens of its own, which would break
+        # up multi-word phrases; match on the remaining tokens instead
+        doc = nlp_artifacts.tokens
+        tokens = [token for token in doc if not token.is_space]
+        if len(tokens) < len(doc):
+            doc = Doc(doc.vocab, words=[token.text for token in tokens])
+
+        results = []
+        for match_id, start, end in self._matcher(doc):
+            entity_type, phrase_pattern = self._dispatch[match_id]
+            if entities and entity_type not in entities:
+                continue
+
+            first, last = tokens[start], tokens[end - 1]
+            results.append(RecognizerResult(
+                entity_type=entity_type,
+                start=first.idx,
+                end=last.idx + len(last),
+                score=phrase_pattern.score,
+                analysis_explanation=AnalysisExplanation(
+                    recognizer=self.name,
+                    original_score=phrase_pattern.score,
+                    pattern_name=phrase_pattern.name,
+                    textual_explanation=(
+                        f"Detected by `{self.name}` "
+                        f"using phrase list `{phrase_pattern.name}`"
+                    ),
+                ),
+                recognition_metadata={
+                    RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
+                    RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
+                },
+            ))
+
+        return EntityRecognizer.remove_duplicates(results)
 
 
 class PIIAnalyzer:
     """Enhanced PII analyzer with custom recognizers for conversational context."""
 
-    def __init__(self):
-        """Initialize the analyzer with Presidio and custom recognizers."""
-        self.analyzer = AnalyzerEngine()
-
-        # Add custom recognizers
-        custom_recognizers = [
-            create_education_recognizer(),
-            create_occupation_recognizer(),
-            create_relationship_recognizer(),
-            create_age_recognizer(),
-            create_health_recognizer(),
+    def __init__(self, model_name: str = DEFAULT_SPACY_MODEL):
+        """
+        Initialize the analyzer with Presidio and custom recognizers.
+
+        Args:
+            model_name: spaCy model used for NER. The small model is much
+                faster; larger models (e.g. en_core_web_lg) trade latency
+                for better PERSON/LOCATION recall.
+        """
+        # Start from Presidio's default configuration so its NER label
+        # mapping and ignored labels still apply; only the model changes
+        provider = NlpEngineProvider()
+        provider.nlp_configuration["models"] = [
+            {"lang_code": "en", "model_name": model_name}
         ]
+        nlp_engine = provider.create_engine()
+
+        # Presidio never reads the dependency parse, so skip running it.
+        # The lemmatizer stays on: context enhancement matches on lemmas.
+        nlp = nlp_engine.nlp["en"]
+        for pipe_name in UNUSED_SPACY_PIPES:
+            if pipe_name in nlp.pipe_names:
+                nlp.disable_pipe(pipe_name)
+
+        self.analyzer = AnalyzerEngine(nlp_engine=nlp_engine)
+        self.batch_analyzer = BatchAnalyzerEngine(analyzer_engine=self.analyzer)
+
+        # Regex patterns run as a single recognizer (one pass per entity type);
+        # vocabulary lists are matched on the tokens spaCy already produced
+        self.analyzer.registry.add_recognizer(
+            MergedPatternRecognizer(CUSTOM_PATTERNS)
+        )
+        self.analyzer.registry.add_recognizer(
+            PhraseMatcherRecognizer(CUSTOM_PHRASES, nlp)
+        )
 
-        for recognizer in custom_recognizers:
-            self.analyzer.registry.add_recognizer(recognizer)
+        # Entity types requested from Presidio: the ones the UI knows about
+        # that some loaded recognizer can actually detect. Requesting a type
+        # without a recognizer makes Presidio log a warning on every call.
+        supported = set(self.analyzer.get_supported_entities())
+        self.detected_entities = [e for e in COLOR_GUIDE if e in supported]
+
+        # Identical text always yields identical results, so replays and
+        # repeated boilerplate messages skip spaCy and the recognizers
+        self._analyze_cached = lru_cache(maxsize=ANALYZE_CACHE_SIZE)(
+            self._analyze_text
+        )
 
     def analyze(
         self,
@@ -245,25 +467,85 @@ class PIIAnalyzer:
         Returns:
             List of PIIEntity objects
         """
+        spans = self._analyze_cached(text, confidence_threshold)
+        return self._to_entities(text, spans, message_index)
+
+    def analyze_batch(
+        self,
+        texts: List[str],
+        confidence_threshold: float = 0.4
+    ) -> List[List[PIIEntity]]:
+        """
+        Analyze several texts at once, e.g. every message in a session.
+
+        spaCy processes the whole batch through nlp.pipe(), amortizing
+        pipeline overhead across texts.
+
+        Args:
+            texts: The texts to analyze, in conversation order
+            confidence_threshold: Minimum confidence score to include entity
+
+        Returns:
+            One list of PIIEntity objects per text; each entity's
+            message_index is the position of its text in texts
+        """
+        if not texts:
+            return []
+
+        batch_results = self.batch_analyzer.analyze_iterator(
+            texts,
+            language='en',
+            batch_size=len(texts),
+            entities=self.detected_entities,
+            score_threshold=confidence_threshold
+        )
+
+        return [
+            self._to_entities(text, self._to_spans(results), idx)
+            for idx, (text, results) in enumerate(zip(texts, batch_results))
+        ]
+
+    def cache_info(self):
+        """Get hit/miss statistics for the analyze() result cache."""
+        return self._analyze_cached.cache_info()
+
+    def _analyze_text(self, text: str, confidence_threshold: float) -> Tuple[Span, ...]:
+        """Run Presidio over a single text (uncached)."""
         results = self.analyzer.analyze(
             text=text,
-            entities=None,  # Detect all entities
-            language='en'
+            entities=self.detected_entities,
+            language='en',
+            score_threshold=confidence_threshold
+        )
+        return self._to_spans(results)
+
+    @staticmethod
+    def _to_spans(results: List[RecognizerResult]) -> Tuple[Span, ...]:
+        """Reduce Presidio results to immutable spans."""
+        return tuple(
+            (sys.intern(result.entity_type), result.score, result.start, result.end)
+            for result in results
         )
 
+    @staticmethod
+    def _to_entities(
+        text: str,
+        spans: Tuple[Span, ...],
+        message_index: int
+    ) -> List[PIIEntity]:
+        """Build fresh PIIEntity objects for one text from its spans."""
         entities = []
-        for result in results:
-            if result.score >= confidence_threshold:
-                entity = PIIEntity(
-                    text=text[result.start:result.end],
-                    entity_type=result.entity_type,
-                    score=result.score,
-                    start=result.start,
-                    end=result.end,
-                    color=COLOR_GUIDE.get(result.entity_type, DEFAULT_COLOR),
-                    message_index=message_index
-                )
-                entities.append(entity)
+        for entity_type, score, start, end in spans:
+            entity = PIIEntity(
+                text=text[start:end],
+                entity_type=entity_type,
+                score=score,
+                start=start,
+                end=end,
+                color=COLOR_GUIDE.get(entity_type, DEFAULT_COLOR),
+                message_index=message_index
+            )
+            entities.append(entity)
 
         return entities
 
@@ -3,12 +3,22 @@ Profile Builder for Theo - Conversational PII Tracker
 Aggregates PII across messages and categorizes into a user profile.
 """
 
+from array import array
 from dataclasses import dataclass, field
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
 import hashlib
+import re
+import unicodedata
 
 from .session_manager import PIIEntity
 
+try:
+    from xxhash import xxh3_128_intdigest as _value_hash
+except ImportError:
+    def _value_hash(data: bytes) -> int:
+        """128-bit hash of a profile value (BLAKE2b fallback when xxhash is missing)."""
+        return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), "big")
+
 
 # Entity type to category mapping
 ENTITY_CATEGORIES = {
@@ -76,6 +86,9 @@ ENTITY_CATEGORIES = {
     "AGE_GROUP": "demographics",
 }
 
+# Category for entity types not listed above
+DEFAULT_CATEGORY = "identity"
+
 # Category display names and colors
 CATEGORY_INFO = {
     "identity": {"name": "Identity", "color": "#FF7D63", "icon": "user"},
@@ -92,23 +105,130 @@ CATEGORY_INFO = {
     "demographics": {"name": "Demographics", "color": "#1ABC9C", "icon": "info-circle"},
 }
 
+# Identifiability weight factors for different categories
+CATEGORY_WEIGHTS = {
+    "identity": 25,  # Names are highly identifying
+    "government_id": 30,  # IDs are very identifying
+    "contact": 20,  # Contact info is identifying
+    "location": 15,  # Location helps narrow down
+    "employment": 10,  # Employer + location is identifying
+    "education": 10,  # School + year is identifying
+    "health": 5,  # Health conditions less common
+    "demographics": 5,  # Age helps narrow down
+    "financial": 5,  # Financial info
+    "relationships": 3,  # Family info
+    "temporal": 2,  # Dates
+    "vehicle": 2,  # Vehicle info
+}
 
-@dataclass
+# Unique values beyond this count add nothing to a category's score
+MAX_COUNTED_VALUES = 3
+
+_CATEGORY_WEIGHT_ITEMS = tuple(
+    (cat_key, CATEGORY_WEIGHTS.get(cat_key, 1)) for cat_key in CATEGORY_INFO
+)
+
+
+def _combination_bonus(mask: int) -> int:
+    """Bonus for a (name, location, education, employment) presence bitmask."""
+    has_name = bool(mask & 0b1000)
+    has_location = bool(mask & 0b0100)
+    has_education = bool(mask & 0b0010)
+    has_employment = bool(mask & 0b0001)
+
+    bonus = 0
+    if has_location and has_education:
+        bonus += 10  # Location + education is very identifying
+    if has_location and has_employment:
+        bonus += 10  # Location + job is very identifying
+    if has_name and has_location:
+        bonus += 15  # Name + location is highly identifying
+    return bonus
+
+
+# Combination bonuses precomputed for every presence bitmask
+_COMBINATION_BONUS = tuple(_combination_bonus(mask) for mask in range(16))
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Characters that don't change a value when they trail it (sentence
+# punctuation) or surround it (quotes, brackets). Other symbols are kept,
+# since "$100" vs "100" or "C++" vs "C" are different values.
+_TRAILING_PUNCTUATION = ".,;:!?"
+_ENCLOSING_CHARS = "\"'`()[]{}<>\u201c\u201d\u2018\u2019"
+
+# Character shingle size for fuzzy deduplication
+SHINGLE_SIZE = 3
+
+
+def _display(value: str) -> str:
+    """Display form of a PII value: whitespace collapsed and trimmed."""
+    return _WHITESPACE_RE.sub(" ", value).strip()
+
+
+def _canon(value: str) -> str:
+    """
+    Canonical dedup key for a PII value.
+
+    NFKC-normalized, lowercased, whitespace collapsed, trailing sentence
+    punctuation and surrounding quotes or brackets stripped, so "New York",
+    "new  york " and "(New York.)" all map to the same key.
+    """
+    value = unicodedata.normalize("NFKC", _display(value)).lower()
+    key = value
+    while True:
+        trimmed = key.strip(_ENCLOSING_CHARS + " ").rstrip(_TRAILING_PUNCTUATION + " ")
+        if trimmed == key:
+            break
+        key = trimmed
+    return key or value
+
+
+def _shingles(value: str) -> Set[str]:
+    """Character shingles of a canonical value."""
+    if len(value) <= SHINGLE_SIZE:
+        return {value}
+    return {value[i:i + SHINGLE_SIZE] for i in range(len(value) - SHINGLE_SIZE + 1)}
+
+
+@dataclass(slots=True)
 class CategoryData:
     """Data for a single PII category."""
     name: str
     color: str
     icon: str
-    entities: List[Dict] = field(default_factory=list)
-    unique_values: Set[str] = field(default_factory=set)
+    # Entities are stored as parallel arrays (one slot per entity)
+    texts: List[str] = field(default_factory=list)
+    types: List[str] = field(default_factory=list)
+    scores: array = field(default_factory=lambda: array("d"))
+    message_indices: array = field(default_factory=lambda: array("i"))
+    unique_values: Dict[str, str] = field(default_factory=dict)  # canonical -> display
+
+    def add_entity(self, text: str, entity_type: str, score: float, message_index: int) -> None:
+        """Append one entity to the parallel arrays."""
+        self.texts.append(text)
+        self.types.append(entity_type)
+        self.scores.append(score)
+        self.message_indices.append(message_index)
 
     def to_dict(self) -> dict:
         return {
             "name": self.name,
             "color": self.color,
             "icon": self.icon,
-            "entities": self.entities,
-            "unique_values": list(self.unique_values),
+            "entities": [
+                {
+                    "text": text,
+                    "type": entity_type,
+                    "score": score,
+                    "message_index": message_index
+                }
+                for text, entity_type, score, message_index in zip(
+                    self.texts, self.types, self.scores, self.message_indices
+                )
+            ],
+            "unique_values": list(self.unique_values.values()),
             "count": len(self.unique_values)
         }
 
@@ -134,7 +254,7 @@ class PIIProfile:
         for cat_key, cat_data in self.categories.items():
             if cat_data.unique_values:
                 info = CATEGORY_INFO.get(cat_key, {"name": cat_key})
-                values = ", ".join(list(cat_data.unique_values)[:3])
+                values = ", ".join(list(cat_data.unique_values.values())[:3])
                 if len(cat_data.unique_values) > 3:
                     values += f" (+{len(cat_data.unique_values) - 3} more)"
                 summary.append(f"{info['name']}: {values}")
@@ -144,8 +264,17 @@ class PIIProfile:
 class ProfileBuilder:
     """Builds and maintains a PII profile from conversation entities."""
 
-    def __init__(self):
-        """Initialize the profile builder."""
+    def __init__(self, fuzzy_dedup_threshold: Optional[float] = None):
+        """
+        Initialize the profile builder.
+
+        Args:
+            fuzzy_dedup_threshold: If set, a new value whose character-shingle
+                Jaccard similarity to an existing value in the same category
+                reaches this threshold (e.g. 0.85) is treated as a duplicate.
+                Disabled by default since near-identical IDs can be distinct.
+        """
+        self.fuzzy_dedup_threshold = fuzzy_dedup_threshold
         self._initialize_profile()
 
     def _initialize_profile(self) -> None:
@@ -157,10 +286,23 @@ class ProfileBuilder:
                 color=cat_info["color"],
                 icon=cat_info["icon"]
             )
+        self._shingles: Dict[str, Dict[str, Set[str]]] = {
+            cat_key: {} for cat_key in CATEGORY_INFO
+        }
+        # XOR of per-value hashes, updated as unique values are added
+        self._profile_digest = 0
+
+        # entity type -> (category key, CategoryData), one lookup per entity
+        categories = self.profile.categories
+        self._entity_dispatch: Dict[str, Tuple[str, CategoryData]] = {
+            entity_type: (cat_key, categories[cat_key])
+            for entity_type, cat_key in ENTITY_CATEGORIES.items()
+        }
+        self._default_dispatch = (DEFAULT_CATEGORY, categories[DEFAULT_CATEGORY])
 
     def build_profile(self, entities: List[PIIEntity]) -> PIIProfile:
         """
-        Build a profile from a list of PII entities.
+        Build a profile from scratch from a list of PII entities.
 
         Args:
             entities: List of PIIEntity objects from all messages
@@ -169,26 +311,68 @@ class ProfileBuilder:
             PIIProfile with categorized and aggregated data
         """
         self._initialize_profile()
+        return self.add_entities(entities)
+
+    def add_entities(self, entities: List[PIIEntity]) -> PIIProfile:
+        """
+        Add newly detected PII entities to the current profile.
+
+        Only the new entities are processed, so calling this once per
+        message keeps the cost per turn independent of conversation length.
+
+        Args:
+            entities: List of PIIEntity objects not yet in the profile
+
+        Returns:
+            PIIProfile with categorized and aggregated data
+        """
+        values_changed = False
+        dispatch = self._entity_dispatch
+        default = self._default_dispatch
 
         for entity in entities:
-            category = ENTITY_CATEGORIES.get(entity.entity_type, "identity")
-
-            if category in self.profile.categories:
-                self.profile.categories[category].entities.append({
-                    "text": entity.text,
-                    "type": entity.entity_type,
-                    "score": entity.score,
-                    "message_index": entity.message_index
-                })
-                self.profile.categories[category].unique_values.add(
-                    entity.text.lower().strip()
-                )
+            category, cat_data = dispatch.get(entity.entity_type, default)
+
+            cat_data.add_entity(
+                entity.text,
+                entity.entity_type,
+                entity.score,
+                entity.message_index
+            )
+            values_changed |= self._add_unique_value(category, cat_data, entity.text)
+
+        self.profile.total_entities += len(entities)
 
-        self.profile.total_entities = len(entities)
-        self.profile.identifiability_score = self._calculate_identifiability()
+        # The score only depends on unique values
+        if values_changed:
+            self.profile.identifiability_score = self._calculate_identifiability()
 
         return self.profile
 
+    def _add_unique_value(self, category: str, cat_data: CategoryData, text: str) -> bool:
+        """
+        Record a value in a category unless it duplicates an existing one.
+
+        Returns:
+            True if the value was new
+        """
+        unique_values = cat_data.unique_values
+        key = _canon(text)
+        if key in unique_values:
+            return False
+
+        if self.fuzzy_dedup_threshold is not None:
+            shingles = _shingles(key)
+            known = self._shingles[category]
+            for other in known.values():
+                if len(shingles & other) / len(shingles | other) >= self.fuzzy_dedup_threshold:
+                    return False
+            known[key] = shingles
+
+        unique_values[key] = _display(text)
+        self._profile_digest ^= _value_hash(f"{category}:{key}".encode())
+        return True
+
     def _calculate_identifiability(self) -> float:
         """
         Calculate an identifiability score based on the profile.
@@ -196,44 +380,22 @@ class ProfileBuilder:
         Higher scores mean the person is more identifiable.
         Score is 0-100.
         """
-        score = 0.0
-
-        # Weight factors for different categories
-        weights = {
-            "identity": 25,  # Names are highly identifying
-            "government_id": 30,  # IDs are very identifying
-            "contact": 20,  # Contact info is identifying
-            "location": 15,  # Location helps narrow down
-            "employment": 10,  # Employer + location is identifying
-            "education": 10,  # School + year is identifying
-            "health": 5,  # Health conditions less common
-            "demographics": 5,  # Age helps narrow down
-            "financial": 5,  # Financial info
-            "relationships": 3,  # Family info
-            "temporal": 2,  # Dates
-            "vehicle": 2,  # Vehicle info
-        }
+        categories = self.profile.categories
 
-        for cat_key, cat_data in self.profile.categories.items():
-            unique_count = len(cat_data.unique_values)
-            if unique_count > 0:
-                weight = weights.get(cat_key, 1)
-                # Diminishing returns for multiple values in same category
-                category_score = weight * min(unique_count, 3) / 3
-                score += category_score
+        # Diminishing returns for multiple values in same category
+        score = sum(
+            weight * min(len(categories[cat_key].unique_values), MAX_COUNTED_VALUES) / MAX_COUNTED_VALUES
+            for cat_key, weight in _CATEGORY_WEIGHT_ITEMS
+        )
 
         # Bonus for combinations that are especially identifying
-        has_location = len(self.profile.categories.get("location", CategoryData("", "", "")).unique_values) > 0
-        has_education = len(self.profile.categories.get("education", CategoryData("", "", "")).unique_values) > 0
-        has_employment = len(self.profile.categories.get("employment", CategoryData("", "", "")).unique_values) > 0
-        has_name = len(self.profile.categories.get("identity", CategoryData("", "", "")).unique_values) > 0
-
-        if has_location and has_education:
-            score += 10  # Location + education is very identifying
-        if has_location and has_employment:
-            score += 10  # Location + job is very identifying
-        if has_name and has_location:
-            score += 15  # Name + location is highly identifying
+        mask = (
+            (bool(categories["identity"].unique_values) << 3)
+            | (bool(categories["location"].unique_values) << 2)
+            | (bool(categories["education"].unique_values) << 1)
+            | bool(categories["employment"].unique_values)
+        )
+        score += _COMBINATION_BONUS[mask]
 
         return min(100.0, score)
 
@@ -241,28 +403,30 @@ class ProfileBuilder:
         """
         Get a hash of the current profile for caching purposes.
 
+        The hash is an order-independent combination of each category's
+        unique values, maintained incrementally as values are added, so it
+        is stable across runs and costs O(1) to read.
+
         Returns:
-            MD5 hash of the profile's unique values
+            128-bit hex digest of the profile's unique values
         """
-        all_values = []
-        for cat_data in self.profile.categories.values():
-            all_values.extend(sorted(cat_data.unique_values))
-
-        content = "|".join(all_values)
-        return hashlib.md5(content.encode()).hexdigest()
+        return f"{self._profile_digest:032x}"
 
     def get_inference_context(self) -> str:
         """
         Generate context string for LLM inference.
 
+        Categories and values are emitted in sorted order so an unchanged
+        profile always produces the same prompt.
+
         Returns:
             Formatted string describing all known PII
         """
         context_parts = []
 
-        for cat_key, cat_data in self.profile.categories.items():
+        for cat_key, cat_data in sorted(self.profile.categories.items()):
             if cat_data.unique_values:
-                values = ", ".join(cat_data.unique_values)
+                values = ", ".join(sorted(cat_data.unique_values.values()))
                 context_parts.append(f"- {cat_data.name}: {values}")
 
         if not context_parts:
@@ -3,13 +3,37 @@ Session Manager for Theo - Conversational PII Tracker
 Handles in-memory storage of conversation sessions and PII data.
 """
 
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from itertools import chain
+import logging
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
 import uuid
 
+if TYPE_CHECKING:
+    from .pii_analyzer import PIIAnalyzer
+    from .profile_builder import ProfileBuilder
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Default bounds on in-memory session storage
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_SESSION_TTL_SECONDS = 3600
+
+# Minimum seconds between capacity eviction warnings
+EVICTION_WARNING_INTERVAL = 60
+
+
+def _format_timestamp(timestamp_ns: int) -> str:
+    """Format a nanosecond epoch timestamp as an ISO 8601 UTC string."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
+
+@dataclass(slots=True)
 class PIIEntity:
     """Represents a single PII entity detected in text."""
     text: str
@@ -21,19 +45,19 @@ class PIIEntity:
     message_index: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """Represents a single message in the conversation."""
     role: str  # 'user' or 'assistant'
     content: str
-    timestamp: str
+    timestamp: int = field(default_factory=time.time_ns)  # ns since epoch
     pii_entities: List[PIIEntity] = field(default_factory=list)
 
     def to_dict(self) -> dict:
         return {
             'role': self.role,
             'content': self.content,
-            'timestamp': self.timestamp,
+            'timestamp': _format_timestamp(self.timestamp),
             'pii_entities': [
                 {
                     'text': e.text,
@@ -54,38 +78,112 @@ class ConversationSession:
     """Represents a conversation session with accumulated PII."""
     session_id: str
     messages: List[Message] = field(default_factory=list)
-    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_at: int = field(default_factory=time.time_ns)  # ns since epoch
     last_inference: Optional[str] = None
     inference_cache_hash: Optional[str] = None
+    # Incrementally maintained PII profile, attached by the app layer
+    profile_builder: Optional["ProfileBuilder"] = None
+
+    def cached_inference(self, profile_hash: str) -> Optional[str]:
+        """Get the last inference if it was generated for this profile hash."""
+        if self.inference_cache_hash != profile_hash:
+            return None
+        return self.last_inference
 
     def to_dict(self) -> dict:
         return {
             'session_id': self.session_id,
             'messages': [m.to_dict() for m in self.messages],
-            'created_at': self.created_at,
+            'created_at': _format_timestamp(self.created_at),
             'last_inference': self.last_inference
         }
 
 
 class SessionManager:
-    """Manages in-memory conversation sessions."""
+    """
+    Manages in-memory conversation sessions.
+
+    Sessions are kept in least-recently-used order and expire after
+    ttl_seconds without access; when more than max_sessions are live the
+    least recently used ones are evicted. Storage is guarded by a lock, so
+    the manager can be shared by Flask's request threads.
+    """
 
-    def __init__(self):
-        self._sessions: Dict[str, ConversationSession] = {}
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        ttl_seconds: float = DEFAULT_SESSION_TTL_SECONDS
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        # session_id -> (session, last access time), oldest access first
+        self._sessions: "OrderedDict[str, Tuple[ConversationSession, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._capacity_evictions = 0
+        self._last_eviction_warning = 0.0
 
     def get_or_create_session(self, session_id: Optional[str] = None) -> ConversationSession:
         """Get existing session or create a new one."""
-        if session_id and session_id in self._sessions:
-            return self._sessions[session_id]
+        with self._lock:
+            if session_id:
+                session = self._get_session_locked(session_id)
+                if session:
+                    return session
 
-        new_id = session_id or str(uuid.uuid4())
-        session = ConversationSession(session_id=new_id)
-        self._sessions[new_id] = session
-        return session
+            new_id = session_id or str(uuid.uuid4())
+            session = ConversationSession(session_id=new_id)
+            self._sessions[new_id] = (session, time.monotonic())
+            self._evict_locked()
+            return session
 
     def get_session(self, session_id: str) -> Optional[ConversationSession]:
-        """Get a session by ID."""
-        return self._sessions.get(session_id)
+        """Get a session by ID, refreshing its last access time."""
+        with self._lock:
+            return self._get_session_locked(session_id)
+
+    def _get_session_locked(self, session_id: str) -> Optional[ConversationSession]:
+        """get_session() body; the caller holds self._lock."""
+        entry = self._sessions.get(session_id)
+        if not entry:
+            return None
+
+        session, last_access = entry
+        now = time.monotonic()
+        if now - last_access > self.ttl_seconds:
+            self._sessions.pop(session_id, None)
+            return None
+
+        self._sessions[session_id] = (session, now)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_locked(self) -> None:
+        """
+        Drop expired sessions, then least recently used ones over capacity.
+
+        The caller holds self._lock.
+        """
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            _, (_, last_access) = next(iter(self._sessions.items()))
+            if last_access > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._capacity_evictions += 1
+
+        now = time.monotonic()
+        if self._capacity_evictions and now - self._last_eviction_warning >= EVICTION_WARNING_INTERVAL:
+            logger.warning(
+                "Evicted %d active session(s) to stay under max_sessions=%d; "
+                "consider raising SESSIONS_MAX",
+                self._capacity_evictions,
+                self.max_sessions
+            )
+            self._capacity_evictions = 0
+            self._last_eviction_warning = now
 
     def add_message(
         self,
@@ -98,15 +196,19 @@ class SessionManager:
         session = self.get_or_create_session(session_id)
 
         message = Message(
-            role=role,
+            role=sys.intern(role),
             content=content,
-            timestamp=datetime.now().isoformat(),
             pii_entities=pii_entities
         )
         session.messages.append(message)
 
-        # Invalidate inference cache when new message is added
-        session.inference_cache_hash = None
+        # Stamp entities with their message's position once, at insertion
+        message_index = len(session.messages) - 1
+        for entity in pii_entities:
+            entity.message_index = message_index
+
+        # No inference cache invalidation needed here: the cached inference
+        # is keyed on the profile hash, which only changes with new PII
 
         return message
 
@@ -116,22 +218,30 @@ class SessionManager:
         if not session:
             return []
 
-        all_entities = []
-        for idx, message in enumerate(session.messages):
-            for entity in message.pii_entities:
-                # Create a copy with updated message_index
-                entity_copy = PIIEntity(
-                    text=entity.text,
-                    entity_type=entity.entity_type,
-                    score=entity.score,
-                    start=entity.start,
-                    end=entity.end,
-                    color=entity.color,
-                    message_index=idx
-                )
-                all_entities.append(entity_copy)
-
-        return all_entities
+        return list(chain.from_iterable(m.pii_entities for m in session.messages))
+
+    def rescore_session(self, session_id: str, analyzer: "PIIAnalyzer") -> List[PIIEntity]:
+        """
+        Re-analyze every message in a session in a single batch.
+
+        Replaces each message's PII entities with fresh results.
+
+        Returns:
+            All PII entities in the session after re-scoring
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return []
+
+        batch_entities = analyzer.analyze_batch([m.content for m in session.messages])
+        for message, entities in zip(session.messages, batch_entities):
+            message.pii_entities = entities
+
+        # Entities may have changed, so rebuild the profile on next use; the
+        # cached inference is keyed on the profile hash and needs no reset
+        session.profile_builder = None
+
+        return self.get_all_pii_entities(session_id)
 
     def update_inference(self, session_id: str, inference: str, cache_hash: str) -> None:
         """Update the inference for a session."""
@@ -142,8 +252,8 @@ class SessionManager:
 
     def reset_session(self, session_id: str) -> None:
         """Clear a session's data."""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        with self._lock:
+            self._sessions.pop(session_id, None)
 
     def get_message_count(self, session_id: str) -> int:
         """Get the number of messages in a session."""
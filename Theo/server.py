@@ -7,7 +7,7 @@ import os
 import logging
 import uuid
 from pathlib import Path
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, render_template, session, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -45,9 +45,11 @@ allowed_origins = os.getenv("CORS_ORIGINS", "http://localhost:5001,http://127.0.
 CORS(app, origins=allowed_origins)
 
 # Initialize global components
-session_manager = SessionManager()
+session_manager = SessionManager(
+    max_sessions=int(os.getenv("SESSIONS_MAX", "10000")),
+    ttl_seconds=float(os.getenv("SESSIONS_TTL_SECONDS", "3600"))
+)
 pii_analyzer = PIIAnalyzer()
-profile_builder = ProfileBuilder()
 inference_engine = InferenceEngine()
 
 
@@ -58,6 +60,27 @@ def get_session_id() -> str:
     return session["session_id"]
 
 
+def get_profile_builder(session_id: str) -> ProfileBuilder:
+    """
+    Get the incrementally maintained profile builder for a session.
+
+    The builder is created (and built from all existing messages) on first
+    use; afterwards callers feed it only new entities via add_entities().
+    Sessions that don't exist yet get an empty, unattached builder.
+    """
+    conv_session = session_manager.get_session(session_id)
+    if not conv_session:
+        return ProfileBuilder()
+
+    if conv_session.profile_builder is None:
+        conv_session.profile_builder = ProfileBuilder()
+        conv_session.profile_builder.build_profile(
+            session_manager.get_all_pii_entities(session_id)
+        )
+
+    return conv_session.profile_builder
+
+
 @app.route("/")
 def index():
     """Serve the main chat UI."""
@@ -99,6 +122,9 @@ def add_message():
     # Analyze PII in the message
     pii_entities = pii_analyzer.analyze(content, message_index)
 
+    # Profile reflecting the messages before this one
+    profile_builder = get_profile_builder(session_id)
+
     # Add message to session
     message = session_manager.add_message(
         session_id=session_id,
@@ -107,13 +133,12 @@ def add_message():
         pii_entities=pii_entities
     )
 
-    # Build updated profile
-    all_entities = session_manager.get_all_pii_entities(session_id)
-    profile = profile_builder.build_profile(all_entities)
+    # Update the profile with just this message's entities
+    profile = profile_builder.add_entities(message.pii_entities)
 
     # Generate quick inference if API key is available
     quick_inference = None
-    if inference_engine.is_available() and len(all_entities) > 0:
+    if inference_engine.is_available() and profile.total_entities > 0:
         context = profile_builder.get_inference_context()
         quick_inference = inference_engine.generate_quick_inference(context)
 
@@ -137,9 +162,7 @@ def get_profile():
         }
     """
     session_id = get_session_id()
-
-    all_entities = session_manager.get_all_pii_entities(session_id)
-    profile = profile_builder.build_profile(all_entities)
+    profile = get_profile_builder(session_id).profile
 
     conv_session = session_manager.get_session(session_id)
 
@@ -150,6 +173,29 @@ def get_profile():
     })
 
 
+@app.route("/rescore", methods=["POST"])
+def rescore_session():
+    """
+    Re-analyze every message in the session for PII in one batch.
+
+    Returns:
+        {
+            "messages": [...],
+            "profile": {...}
+        }
+    """
+    session_id = get_session_id()
+    session_manager.rescore_session(session_id, pii_analyzer)
+    profile = get_profile_builder(session_id).profile
+
+    conv_session = session_manager.get_session(session_id)
+
+    return jsonify({
+        "messages": [m.to_dict() for m in conv_session.messages] if conv_session else [],
+        "profile": profile.to_dict()
+    })
+
+
 @app.route("/conversation", methods=["GET"])
 def get_conversation():
     """
@@ -201,29 +247,23 @@ def generate_inference():
             "profile_hash": ""
         })
 
-    # Check cache
-    all_entities = session_manager.get_all_pii_entities(session_id)
-    profile = profile_builder.build_profile(all_entities)
+    profile_builder = get_profile_builder(session_id)
     current_hash = profile_builder.get_profile_hash()
 
-    if conv_session.inference_cache_hash == current_hash and conv_session.last_inference:
-        return jsonify({
-            "inference": conv_session.last_inference,
-            "profile_hash": current_hash,
-            "cached": True
-        })
-
-    # Generate new inference
-    context = profile_builder.get_inference_context()
+    # Reuse the session's last inference while the profile is unchanged
+    inference = conv_session.cached_inference(current_hash)
+    cached = inference is not None
 
     try:
-        inference = inference_engine.generate_inference(context)
-        session_manager.update_inference(session_id, inference, current_hash)
+        if not cached:
+            context = profile_builder.get_inference_context()
+            inference = inference_engine.generate_inference(context)
+            session_manager.update_inference(session_id, inference, current_hash)
 
         return jsonify({
             "inference": inference,
             "profile_hash": current_hash,
-            "cached": False
+            "cached": cached
         })
 
     except Exception as e:
@@ -231,6 +271,62 @@ def generate_inference():
         return jsonify({"error": "Failed to generate inference. Please try again."}), 500
 
 
+@app.route("/infer/stream", methods=["POST"])
+def stream_inference():
+    """
+    Stream a detailed inference from the accumulated PII as plain text.
+
+    The profile hash is sent in the X-Profile-Hash header, and
+    X-Inference-Cached is "true" when the session's last inference is
+    replayed because the profile hasn't changed.
+    """
+    if not inference_engine.is_available():
+        return jsonify({
+            "error": "OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+        }), 503
+
+    session_id = get_session_id()
+    conv_session = session_manager.get_session(session_id)
+
+    if not conv_session or len(conv_session.messages) == 0:
+        return Response(
+            "No messages in the conversation yet. Add some messages to see what can be inferred.",
+            mimetype="text/plain"
+        )
+
+    profile_builder = get_profile_builder(session_id)
+    current_hash = profile_builder.get_profile_hash()
+
+    cached_inference = conv_session.cached_inference(current_hash)
+    if cached_inference is not None:
+        return Response(
+            cached_inference,
+            mimetype="text/plain",
+            headers={"X-Profile-Hash": current_hash, "X-Inference-Cached": "true"}
+        )
+
+    context = profile_builder.get_inference_context()
+
+    def generate():
+        parts = []
+        try:
+            for chunk in inference_engine.stream_inference(context):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Inference streaming failed: {e}", exc_info=True)
+            yield "\n\nFailed to generate inference. Please try again."
+            return
+
+        session_manager.update_inference(session_id, "".join(parts), current_hash)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/plain",
+        headers={"X-Profile-Hash": current_hash, "X-Inference-Cached": "false"}
+    )
+
+
 @app.route("/reset", methods=["POST"])
 def reset_session():
     """
@@ -0,0 +1,6 @@
+"""Make the Theo app packages importable when running pytest from the repo."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,54 @@
+"""
+Smoke tests for PIIAnalyzer against a real Presidio + spaCy pipeline.
+
+Skipped when presidio-analyzer or the spaCy model isn't installed.
+"""
+
+import pytest
+
+pytest.importorskip("presidio_analyzer")
+spacy = pytest.importorskip("spacy")
+
+from core.pii_analyzer import DEFAULT_SPACY_MODEL, PIIAnalyzer
+
+if not spacy.util.is_package(DEFAULT_SPACY_MODEL):
+    pytest.skip(
+        f"spaCy model {DEFAULT_SPACY_MODEL} is not installed",
+        allow_module_level=True
+    )
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return PIIAnalyzer(model_name=DEFAULT_SPACY_MODEL)
+
+
+def found(entities):
+    return {(e.entity_type, e.text) for e in entities}
+
+
+def test_analyze_detects_custom_entities(analyzer):
+    entities = analyzer.analyze("My wife is a nurse and I'm 34 years old.")
+
+    assert ("RELATIONSHIP", "My wife") in found(entities)
+    assert ("OCCUPATION", "nurse") in found(entities)
+    assert any(e.entity_type == "AGE" for e in entities)
+
+
+def test_phrases_match_across_extra_whitespace(analyzer):
+    entities = analyzer.analyze("My doctor said I had  cancer")
+
+    assert ("HEALTH_CONDITION", "had  cancer") in found(entities)
+
+
+def test_overlapping_regex_matches_of_different_types(analyzer):
+    entities = analyzer.analyze("I'm a senior citizen")
+
+    assert ("AGE", "senior citizen") in found(entities)
+    assert ("EDUCATION_LEVEL", "senior") in found(entities)
+
+
+def test_education_suffix_is_included_when_present(analyzer):
+    entities = analyzer.analyze("I'm a grad student")
+
+    assert ("EDUCATION_LEVEL", "grad student") in found(entities)
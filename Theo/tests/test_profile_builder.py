@@ -0,0 +1,149 @@
+"""Tests for ProfileBuilder aggregation, deduplication and scoring."""
+
+import pytest
+
+from core.profile_builder import ProfileBuilder, _canon
+from core.session_manager import PIIEntity
+
+
+def make_entity(text, entity_type, message_index=0, score=0.85):
+    return PIIEntity(
+        text=text,
+        entity_type=entity_type,
+        score=score,
+        start=0,
+        end=len(text),
+        color="#000000",
+        message_index=message_index
+    )
+
+
+def unique_values(profile, category):
+    return profile.categories[category].to_dict()["unique_values"]
+
+
+def test_canonical_forms_collapse_to_first_seen_display_value():
+    profile = ProfileBuilder().build_profile([
+        make_entity("New York", "LOCATION"),
+        make_entity("new  york ", "LOCATION", 1),
+        make_entity("(New York.)", "LOCATION", 2),
+        make_entity("“New York”", "LOCATION", 3),
+    ])
+
+    assert unique_values(profile, "location") == ["New York"]
+
+
+def test_significant_symbols_are_kept_in_canonical_form():
+    assert _canon("$100") != _canon("100")
+    assert _canon("C++") != _canon("C")
+    assert _canon("C#") != _canon("C")
+    assert _canon("+1 555 0100") != _canon("1 555 0100")
+    assert _canon("NYC!") == _canon("nyc")
+
+
+def test_fuzzy_dedup_is_off_by_default():
+    entities = [
+        make_entity("Union College", "SCHOOL_NAME"),
+        make_entity("Union Colleges", "SCHOOL_NAME", 1),
+    ]
+
+    assert len(unique_values(ProfileBuilder().build_profile(entities), "education")) == 2
+
+    fuzzy = ProfileBuilder(fuzzy_dedup_threshold=0.8).build_profile(entities)
+    assert unique_values(fuzzy, "education") == ["Union College"]
+
+
+def test_identifiability_weights_and_diminishing_returns():
+    assert ProfileBuilder().build_profile([]).identifiability_score == 0
+
+    one = ProfileBuilder().build_profile([make_entity("Albany", "LOCATION")])
+    assert one.identifiability_score == pytest.approx(15 / 3)
+
+    many = ProfileBuilder().build_profile([
+        make_entity(city, "LOCATION", i)
+        for i, city in enumerate(["Albany", "Troy", "Schenectady", "Utica", "Rome"])
+    ])
+    assert many.identifiability_score == pytest.approx(15)
+
+
+def test_identifiability_combination_bonuses():
+    profile = ProfileBuilder().build_profile([
+        make_entity("Jane Doe", "PERSON"),
+        make_entity("Schenectady", "LOCATION", 1),
+        make_entity("college student", "EDUCATION_LEVEL", 2),
+    ])
+
+    # Per-category weights, plus name+location (15) and location+education (10)
+    expected = 25 / 3 + 15 / 3 + 10 / 3 + 15 + 10
+    assert profile.identifiability_score == pytest.approx(expected)
+
+
+def test_identifiability_is_capped_at_100():
+    entities = [
+        make_entity(f"{entity_type} {i}", entity_type, i)
+        for entity_type in ("PERSON", "US_SSN", "EMAIL_ADDRESS", "LOCATION",
+                            "OCCUPATION", "EDUCATION_LEVEL", "CREDIT_CARD")
+        for i in range(3)
+    ]
+
+    assert ProfileBuilder().build_profile(entities).identifiability_score == 100.0
+
+
+def profile_hash(entities):
+    builder = ProfileBuilder()
+    builder.build_profile(entities)
+    return builder.get_profile_hash()
+
+
+def test_profile_hash_ignores_order_and_repeats():
+    entities = [
+        make_entity("Jane Doe", "PERSON"),
+        make_entity("Schenectady", "LOCATION", 1),
+        make_entity("nurse", "OCCUPATION", 2),
+    ]
+
+    assert profile_hash(entities) == profile_hash(list(reversed(entities)))
+    # A repeated value must not cancel itself out of the XOR digest
+    assert profile_hash(entities + [make_entity("jane doe", "PERSON", 3)]) == profile_hash(entities)
+
+
+def test_profile_hash_changes_with_values_and_categories():
+    base = profile_hash([make_entity("Schenectady", "LOCATION")])
+
+    assert profile_hash([]) != base
+    assert profile_hash([make_entity("Albany", "LOCATION")]) != base
+    assert profile_hash([
+        make_entity("Schenectady", "LOCATION"),
+        make_entity("Albany", "LOCATION", 1),
+    ]) != base
+    # Same text under another category is a different profile
+    assert profile_hash([make_entity("Schenectady", "PERSON")]) != base
+
+
+def test_incremental_build_matches_cold_build():
+    messages = [
+        [make_entity("Jane Doe", "PERSON"), make_entity("Schenectady", "LOCATION")],
+        [],
+        [make_entity("nurse", "OCCUPATION", 2), make_entity("jane doe", "PERSON", 2)],
+        [make_entity("my husband", "RELATIONSHIP", 3)],
+    ]
+
+    incremental = ProfileBuilder()
+    for entities in messages:
+        incremental.add_entities(entities)
+
+    cold = ProfileBuilder()
+    cold.build_profile([e for entities in messages for e in entities])
+
+    assert incremental.profile.to_dict() == cold.profile.to_dict()
+    assert incremental.get_profile_hash() == cold.get_profile_hash()
+
+
+def test_build_profile_starts_from_scratch():
+    builder = ProfileBuilder()
+    builder.build_profile([make_entity("Jane Doe", "PERSON")])
+    profile = builder.build_profile([make_entity("Albany", "LOCATION")])
+
+    assert profile.total_entities == 1
+    assert unique_values(profile, "identity") == []
+    assert builder.get_profile_hash() == profile_hash([make_entity("Albany", "LOCATION")])
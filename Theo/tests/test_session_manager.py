@@ -0,0 +1,167 @@
+"""Tests for SessionManager storage and message bookkeeping."""
+
+import logging
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core import session_manager
+from core.session_manager import PIIEntity, SessionManager
+
+
+def make_entity(text, entity_type="PERSON", message_index=0):
+    return PIIEntity(
+        text=text,
+        entity_type=entity_type,
+        score=0.85,
+        start=0,
+        end=len(text),
+        color="#000000",
+        message_index=message_index
+    )
+
+
+def test_entities_are_stamped_with_their_message_index():
+    manager = SessionManager()
+    manager.add_message("s1", "user", "Hi, I'm Jane", [make_entity("Jane")])
+    manager.add_message("s1", "assistant", "Hello!", [])
+    # Analyzer output carries a placeholder index; insertion fixes it up
+    manager.add_message("s1", "user", "I live in Albany", [make_entity("Albany", "LOCATION")])
+
+    entities = manager.get_all_pii_entities("s1")
+
+    assert [(e.text, e.message_index) for e in entities] == [("Jane", 0), ("Albany", 2)]
+
+
+def test_unknown_session_has_no_entities():
+    assert SessionManager().get_all_pii_entities("missing") == []
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic() for session_manager."""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(
+        session_manager, "time", SimpleNamespace(monotonic=lambda: now.value)
+    )
+    return now
+
+
+def test_least_recently_used_session_is_evicted_first(clock):
+    manager = SessionManager(max_sessions=2)
+    manager.get_or_create_session("a")
+    manager.get_or_create_session("b")
+    clock.value += 1
+    manager.get_session("a")  # "b" is now least recently used
+    manager.get_or_create_session("c")
+
+    assert manager.get_session("b") is None
+    assert manager.get_session("a") is not None
+    assert manager.get_session("c") is not None
+
+
+def test_sessions_expire_after_idle_ttl(clock):
+    manager = SessionManager(ttl_seconds=60)
+    session = manager.get_or_create_session("a")
+
+    clock.value += 50
+    assert manager.get_session("a") is session  # access slides the TTL
+    clock.value += 50
+    assert manager.get_session("a") is session
+    clock.value += 61
+    assert manager.get_session("a") is None
+    assert manager.get_or_create_session("a") is not session
+
+
+def test_expired_sessions_are_dropped_on_insert(clock):
+    manager = SessionManager(ttl_seconds=60)
+    manager.get_or_create_session("old")
+    clock.value += 61
+    manager.get_or_create_session("new")
+
+    assert list(manager._sessions) == ["new"]
+
+
+def test_capacity_eviction_warning_is_throttled(clock, caplog):
+    manager = SessionManager(max_sessions=1)
+    with caplog.at_level(logging.WARNING, logger=session_manager.__name__):
+        for i in range(5):
+            manager.get_or_create_session(f"s{i}")
+        assert len(caplog.records) == 1
+        assert "Evicted 1 active session" in caplog.records[0].getMessage()
+
+        clock.value += session_manager.EVICTION_WARNING_INTERVAL
+        manager.get_or_create_session("late")
+        assert len(caplog.records) == 2
+        # Evictions since the last warning are reported together
+        assert "Evicted 4 active session" in caplog.records[1].getMessage()
+
+
+def test_reset_session_removes_it():
+    manager = SessionManager()
+    manager.get_or_create_session("a")
+    manager.reset_session("a")
+    manager.reset_session("a")
+
+    assert manager.get_session("a") is None
+
+
+def test_concurrent_access_keeps_storage_consistent():
+    manager = SessionManager(max_sessions=50, ttl_seconds=3600)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(2000):
+                session_id = f"s{(offset + i) % 80}"
+                manager.get_or_create_session(session_id)
+                manager.get_session(f"s{(offset * 7 + i) % 80}")
+                if i % 5 == 0:
+                    manager.reset_session(session_id)
+        except Exception as e:  # pragma: no cover - only on failure
+            errors.append(e)
+
+    # Switch threads as often as possible to surface interleavings
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert len(manager._sessions) <= 50
+
+
+def test_cached_inference_is_keyed_on_profile_hash():
+    manager = SessionManager()
+    session = manager.get_or_create_session("a")
+    assert session.cached_inference("h1") is None
+
+    manager.update_inference("a", "Likely a nurse in Albany.", "h1")
+    # Messages without new PII leave the cached inference in place
+    manager.add_message("a", "user", "thanks!", [])
+
+    assert session.cached_inference("h1") == "Likely a nurse in Albany."
+    assert session.cached_inference("h2") is None
+
+
+def test_timestamps_are_stored_as_ns_and_serialized_as_utc_iso():
+    manager = SessionManager()
+    manager.add_message("a", "user", "hello", [])
+    session = manager.get_session("a")
+    message = session.messages[0]
+
+    assert isinstance(session.created_at, int)
+    assert isinstance(message.timestamp, int)
+    assert message.timestamp >= session.created_at
+
+    message.timestamp = 1_700_000_000_123_456_789
+    assert message.to_dict()["timestamp"] == "2023-11-14T22:13:20.123457+00:00"
+    assert session.to_dict()["created_at"].endswith("+00:00")